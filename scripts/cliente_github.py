@@ -6,15 +6,42 @@ Este módulo gerencia a comunicação com a API do GitHub, incluindo:
 - Busca de repositórios populares usando GraphQL
 """
 
+import os
+import json
 import time
+import base64
+import random
+import hashlib
 import logging
+import itertools
+import threading
+from concurrent.futures import ThreadPoolExecutor
 
 import requests
+from requests.adapters import HTTPAdapter, Retry
 from tqdm import tqdm
 
-from configuracao import GITHUB_GRAPHQL_URL, PAGE_SIZE, REPOSITORY_SEARCH_QUERY
+from configuracao import (
+    GITHUB_GRAPHQL_URL,
+    GRAPHQL_CACHE_DIR,
+    GRAPHQL_CACHE_TTL,
+    PAGE_SIZE,
+    REPOSITORY_SEARCH_QUERY,
+)
 from errors import TokenError, GraphQLError, RateLimitError, RequestError
 
+# orjson é opcional: acelera a serialização dos payloads GraphQL
+try:
+    import orjson
+
+    _dumps = orjson.dumps
+    _loads = orjson.loads
+except ImportError:
+    def _dumps(obj):
+        return json.dumps(obj).encode("utf-8")
+
+    _loads = json.loads
+
 GRAPHQL_QUERY = """
 query ($searchQuery: String!, $first: Int!, $after: String) {
   search(query: $searchQuery, type: REPOSITORY, first: $first, after: $after) {
@@ -25,23 +52,22 @@ query ($searchQuery: String!, $first: Int!, $after: String) {
     nodes {
       ... on Repository {
         nameWithOwner
-        url
         stargazerCount
         createdAt
         pushedAt
         primaryLanguage {
           name
         }
-        pullRequests(states: MERGED, first: 1) {
+        pullRequests(states: MERGED) {
           totalCount
         }
-        releases(first: 1) {
+        releases {
           totalCount
         }
-        totalIssues: issues(first: 1) {
+        totalIssues: issues {
           totalCount
         }
-        closedIssues: issues(states: CLOSED, first: 1) {
+        closedIssues: issues(states: CLOSED) {
           totalCount
         }
       }
@@ -50,16 +76,34 @@ query ($searchQuery: String!, $first: Int!, $after: String) {
 }
 """
 
+# Consulta leve usada para saber quantos resultados a busca possui
+COUNT_QUERY = """
+query ($searchQuery: String!) {
+  search(query: $searchQuery, type: REPOSITORY, first: 1) {
+    repositoryCount
+  }
+}
+"""
+
+# A API de busca do GitHub nunca retorna mais que 1000 resultados
+SEARCH_RESULTS_LIMIT = 1000
+
 class TokenManager:
     """Gerenciador de tokens do GitHub com rotação automática.
     
-    Gerencia múltiplos tokens da API do GitHub, fazendo rotação automática
-    quando um token atinge o limite de requisições (rate limit).
+    Gerencia múltiplos tokens da API do GitHub, acompanhando o rate limit de
+    cada um. O token em uso só é trocado quando se esgota, e a espera pelo
+    reset só acontece quando todos os tokens estão esgotados.
     
     Atributos:
-        tokens (list): Lista de tokens válidos do GitHub.
-        index (int): Índice do token atualmente em uso.
+        tokens (dict): Estado de cada token válido do GitHub, no formato
+            ``{token: {"remaining": int, "reset_at": int}}``.
+        session (requests.Session): Sessão HTTP compartilhada, que reaproveita
+            a conexão TLS com a API entre as requisições (keep-alive).
     """
+
+    # Limite de requisições por hora de um token, usado até a primeira resposta
+    DEFAULT_REMAINING = 5000
     
     def __init__(self, tokens):
         """Inicializa o gerenciador com uma lista de tokens.
@@ -73,35 +117,122 @@ class TokenManager:
         cleaned_tokens = [token.strip() for token in tokens if token and token.strip()]
         if not cleaned_tokens:
             raise TokenError("Nenhum token informado. Defina GITHUB_TOKEN ou GITHUB_TOKENS.")
-        self.tokens = cleaned_tokens
-        self.index = 0
+        self.tokens = {
+            token: {"remaining": self.DEFAULT_REMAINING, "reset_at": 0}
+            for token in cleaned_tokens
+        }
+        self._current = cleaned_tokens[0]
+        self._local = threading.local()
+        self._lock = threading.Lock()
+
+        # Sessão única para reaproveitar conexões entre as páginas.
+        # Erros temporários do servidor são repetidos pelo urllib3, com
+        # backoff exponencial, antes de a resposta chegar ao graphql_request.
+        self.session = requests.Session()
+        self.session.headers.update({"Content-Type": "application/json"})
+        adapter = HTTPAdapter(
+            pool_connections=4,
+            pool_maxsize=len(self.tokens) * 2,
+            max_retries=Retry(
+                total=5,
+                backoff_factor=1.0,
+                status_forcelist=[500, 502, 503, 504],
+                allowed_methods=["POST"],
+                respect_retry_after_header=True,
+                raise_on_status=False,
+            ),
+        )
+        self.session.mount("https://", adapter)
+
+    def pin(self, index):
+        """Fixa um token para a thread atual.
+
+        Usado pelos workers da busca paralela para que cada um consuma
+        o rate limit de um token diferente.
+
+        Args:
+            index (int): Índice do token (aplicado em rotação circular).
+        """
+        tokens = list(self.tokens)
+        self._local.token = tokens[index % len(tokens)]
 
     @property
     def current_token(self):
         """Retorna o token atualmente em uso.
         
         Returns:
-            str: Token do GitHub sendo usado no momento.
+            str: Token do GitHub sendo usado no momento (o fixado na thread
+                 atual, se houver).
         """
-        return self.tokens[self.index]
+        return getattr(self._local, "token", self._current)
 
-    def next_token(self):
-        """Avança para o próximo token na rotação circular.
-        
-        Incrementa o índice e volta ao início quando chega ao fim da lista.
+    def _set_current(self, token):
+        if hasattr(self._local, "token"):
+            self._local.token = token
+        else:
+            self._current = token
+
+    def mark(self, remaining, reset_at):
+        """Registra o rate limit informado pela API para o token atual.
+
+        Apenas guarda o estado; a troca de token (e a eventual espera)
+        fica para a próxima requisição, via ``ensure_token``.
+
+        Args:
+            remaining (int): Requisições restantes (X-RateLimit-Remaining).
+            reset_at (int): Timestamp Unix do reset (X-RateLimit-Reset).
+        """
+        with self._lock:
+            state = self.tokens[self.current_token]
+            state["remaining"] = remaining
+            if reset_at > 0:
+                state["reset_at"] = reset_at
+
+    def ensure_token(self):
+        """Garante que o token atual ainda tem requisições disponíveis.
+
+        Chamado antes de cada requisição: se o token atual se esgotou,
+        escolhe outro com ``pick_token``.
+        """
+        if self.tokens[self.current_token]["remaining"] <= 0:
+            self.pick_token()
+
+    def pick_token(self):
+        """Escolhe o token com mais requisições restantes.
+
+        Se todos estiverem esgotados, aguarda o reset mais próximo e
+        restaura os tokens cuja janela de rate limit já terminou.
+
+        Returns:
+            str: Token escolhido para as próximas requisições.
         """
-        self.index = (self.index + 1) % len(self.tokens)
+        with self._lock:
+            exhausted = all(state["remaining"] <= 0 for state in self.tokens.values())
+            reset_at = min(state["reset_at"] for state in self.tokens.values())
+
+        # A espera acontece fora do lock para não bloquear as outras threads
+        if exhausted:
+            self.sleep_until_reset(reset_at)
+
+        with self._lock:
+            now = time.time()
+            for state in self.tokens.values():
+                if state["remaining"] <= 0 and state["reset_at"] <= now:
+                    state["remaining"] = self.DEFAULT_REMAINING
+                    state["reset_at"] = 0
+            token = max(self.tokens, key=lambda t: (self.tokens[t]["remaining"], -self.tokens[t]["reset_at"]))
+            self._set_current(token)
+            return token
 
     def auth_headers(self):
         """Gera os headers de autenticação para requisições HTTP.
         
+        O Content-Type já fica definido na sessão; aqui só vai o token atual.
+
         Returns:
-            dict: Dicionário com headers Authorization e Content-Type.
+            dict: Dicionário com o header Authorization.
         """
-        return {
-            "Authorization": f"Bearer {self.current_token}",
-            "Content-Type": "application/json",
-        }
+        return {"Authorization": f"Bearer {self.current_token}"}
 
     def sleep_until_reset(self, reset_timestamp):
         """Aguarda até o reset do rate limit da API.
@@ -115,16 +246,76 @@ class TokenManager:
         time.sleep(wait_seconds)
 
 
-def graphql_request(token_manager, query, variables):
+def _cache_path(query, variables):
+    """Retorna o arquivo de cache de uma combinação (query, variáveis).
+
+    Args:
+        query (str): Query GraphQL.
+        variables (dict): Variáveis da query GraphQL.
+
+    Returns:
+        str: Caminho do arquivo JSON dentro de GRAPHQL_CACHE_DIR.
+    """
+    raw_key = json.dumps({"q": query, "v": variables}, sort_keys=True).encode()
+    cache_key = hashlib.md5(raw_key).hexdigest()
+    return os.path.join(GRAPHQL_CACHE_DIR, f"{cache_key}.json")
+
+
+def _read_cache(path):
+    """Lê uma resposta do cache se ela existir e ainda estiver válida.
+
+    Args:
+        path (str): Caminho do arquivo de cache.
+
+    Returns:
+        dict | None: Dados em cache, ou None se ausente/expirado/corrompido.
+    """
+    try:
+        with open(path, "rb") as f:
+            entry = _loads(f.read())
+    except (OSError, ValueError):
+        return None
+    if not isinstance(entry, dict):
+        return None
+    saved_at = entry.get("saved_at")
+    data = entry.get("data")
+    if not isinstance(saved_at, (int, float)) or not isinstance(data, dict):
+        return None
+    if time.time() - saved_at > GRAPHQL_CACHE_TTL:
+        return None
+    return data
+
+
+def _write_cache(path, data):
+    """Grava uma resposta no cache (escrita atômica via arquivo temporário).
+
+    Args:
+        path (str): Caminho do arquivo de cache.
+        data (dict): Dados retornados pela API.
+    """
+    try:
+        os.makedirs(GRAPHQL_CACHE_DIR, exist_ok=True)
+        tmp_path = f"{path}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(_dumps({"saved_at": time.time(), "data": data}))
+        os.replace(tmp_path, path)
+    except OSError as exc:
+        logging.warning("Não foi possível gravar o cache GraphQL: %s", exc)
+
+
+def graphql_request(token_manager, query, variables, use_cache=True):
     """Executa uma requisição GraphQL para a API do GitHub com retry automático.
     
     Faz requisições à API GraphQL do GitHub com tratamento robusto de erros,
     incluindo rotação automática de tokens e retry em caso de rate limiting.
+    Respostas bem-sucedidas ficam em cache em disco por GRAPHQL_CACHE_TTL
+    segundos, de modo que execuções repetidas não voltam à API.
     
     Args:
         token_manager (TokenManager): Gerenciador de tokens para autenticação.
         query (str): Query GraphQL a ser executada.
         variables (dict): Variáveis da query GraphQL.
+        use_cache (bool, optional): Se False, ignora o cache local.
         
     Returns:
         dict: Dados retornados pela API no campo 'data'.
@@ -133,14 +324,22 @@ def graphql_request(token_manager, query, variables):
         RuntimeError: Se a requisição falhar após todas as tentativas ou
                      se ocorrer um erro GraphQL não relacionado a rate limit.
     """
+    use_cache = use_cache and GRAPHQL_CACHE_TTL > 0
+    if use_cache:
+        cache_path = _cache_path(query, variables)
+        cached = _read_cache(cache_path)
+        if cached is not None:
+            return cached
+
     attempts = 0
     max_attempts = max(5, len(token_manager.tokens) * 3)
 
     while attempts < max_attempts:
         attempts += 1
-        response = requests.post(
+        token_manager.ensure_token()
+        response = token_manager.session.post(
             GITHUB_GRAPHQL_URL,
-            json={"query": query, "variables": variables},
+            data=_dumps({"query": query, "variables": variables}),
             headers=token_manager.auth_headers(),
             timeout=120,
         )
@@ -149,32 +348,38 @@ def graphql_request(token_manager, query, variables):
         reset_at = int(response.headers.get("X-RateLimit-Reset", "0"))
 
         if response.status_code == 200:
-            payload = response.json()
+            payload = _loads(response.content)
             if "errors" in payload:
                 errors_text = str(payload["errors"]).lower()
                 if "rate limit" in errors_text:
-                    token_manager.next_token()
-                    if token_manager.index == 0 and reset_at > 0:
-                        token_manager.sleep_until_reset(reset_at)
+                    token_manager.mark(0, reset_at)
                     continue
                 raise GraphQLError(f"Erro GraphQL: {payload['errors']}")
 
-            if remaining <= 1:
-                token_manager.next_token()
+            if "X-RateLimit-Remaining" in response.headers:
+                token_manager.mark(remaining, reset_at)
+            if use_cache:
+                _write_cache(cache_path, payload["data"])
             return payload["data"]
 
-        response_text = response.text.lower()
-        if response.status_code in (403, 429) or "rate limit" in response_text:
-            token_manager.next_token()
-            if token_manager.index == 0 and reset_at > 0:
-                token_manager.sleep_until_reset(reset_at)
+        # Rate limit identificado só pelos headers: evita decodificar o corpo
+        if response.status_code in (403, 429) and remaining == 0:
+            token_manager.mark(0, reset_at)
             continue
-        
-        # Retry em erros temporários do servidor (502, 503, 504, 500)
-        if response.status_code in (500, 502, 503, 504):
-            wait_time = 5 + (attempts * 2)
+
+        # Limite secundário (não refletido nos headers): usa o Retry-After
+        # ou, na falta dele, backoff exponencial com jitter
+        response_text = response.text
+        retry_after = response.headers.get("Retry-After")
+        if retry_after is not None or "rate limit" in response_text.lower():
+            if attempts == max_attempts:
+                raise RateLimitError(f"Rate limit persistente: HTTP {response.status_code} - {response_text}")
+            try:
+                wait_time = float(retry_after)
+            except (TypeError, ValueError):
+                wait_time = min(60, (2 ** attempts) + random.uniform(0, 1))
             logging.warning(
-                "Erro temporário %s. Tentativa %s/%s. Aguardando %ss...",
+                "Rate limit HTTP %s. Tentativa %s/%s. Aguardando %.1fs...",
                 response.status_code,
                 attempts,
                 max_attempts,
@@ -183,26 +388,87 @@ def graphql_request(token_manager, query, variables):
             time.sleep(wait_time)
             continue
 
-        raise RequestError(f"Falha na chamada GraphQL: HTTP {response.status_code} - {response.text}")
+        raise RequestError(f"Falha na chamada GraphQL: HTTP {response.status_code} - {response_text}")
 
     raise RequestError("Não foi possível concluir a chamada GraphQL após múltiplas tentativas.")
 
 
-def fetch_top_repositories(token_manager, limit=100):
+def _search_cursor(offset):
+    """Gera o cursor da busca do GitHub para um deslocamento numérico.
+
+    Hoje os cursores da API de busca são o texto ``cursor:<offset>`` em
+    base64, o que permite pedir qualquer página sem encadear as anteriores.
+    O formato não é documentado: ``fetch_top_repositories`` confere o
+    cursor da primeira página antes de usá-lo.
+
+    Args:
+        offset (int): Quantidade de resultados a pular.
+
+    Returns:
+        str | None: Cursor para o argumento ``after`` (None na primeira página).
+    """
+    if offset <= 0:
+        return None
+    return base64.b64encode(f"cursor:{offset}".encode()).decode()
+
+
+def _fetch_page(token_manager, batch_size, after=None, use_cache=True):
+    """Busca uma única página da pesquisa de repositórios.
+
+    Args:
+        token_manager (TokenManager): Gerenciador de tokens para autenticação.
+        batch_size (int): Quantidade de repositórios da página.
+        after (str, optional): Cursor a partir do qual a página começa.
+        use_cache (bool, optional): Se False, ignora o cache local.
+
+    Returns:
+        tuple: Repositórios da página (sem nós nulos) e o ``pageInfo``.
+    """
+    variables = {
+        "searchQuery": REPOSITORY_SEARCH_QUERY,
+        "first": batch_size,
+        "after": after,
+    }
+    data = graphql_request(token_manager, GRAPHQL_QUERY, variables, use_cache)
+    search_result = data["search"]
+    repos = [node for node in search_result["nodes"] if node is not None]
+    return repos, search_result["pageInfo"]
+
+
+def count_repositories(token_manager, use_cache=True):
+    """Consulta quantos repositórios a busca retorna, sem trazer os nós.
+
+    Args:
+        token_manager (TokenManager): Gerenciador de tokens para autenticação.
+        use_cache (bool, optional): Se False, ignora o cache local.
+
+    Returns:
+        int: Total de repositórios acessíveis pela busca (limitado a 1000).
+    """
+    variables = {"searchQuery": REPOSITORY_SEARCH_QUERY}
+    data = graphql_request(token_manager, COUNT_QUERY, variables, use_cache)
+    return min(data["search"]["repositoryCount"], SEARCH_RESULTS_LIMIT)
+
+
+def fetch_top_repositories(token_manager, limit=100, use_cache=True):
     """Busca os top repositórios do GitHub ordenados por estrelas.
     
     Executa uma busca GraphQL para obter repositórios públicos mais populares,
-    ordenados decrescentemente por número de estrelas.
+    ordenados decrescentemente por número de estrelas. Quando há mais de uma
+    página, o total disponível é consultado antes (evitando páginas vazias)
+    e as páginas são buscadas em paralelo, com um worker por token. Se o
+    formato dos cursores não conferir ou a API rejeitar um cursor calculado,
+    as páginas são buscadas em sequência, encadeando o ``endCursor``.
     
     Args:
         token_manager (TokenManager): Gerenciador de tokens para autenticação.
         limit (int, optional): Número máximo de repositórios a buscar.
                               Padrão é 100 (máximo permitido pela API).
+        use_cache (bool, optional): Se False, ignora o cache local de respostas.
     
     Returns:
         list: Lista de dicionários com informações dos repositórios, incluindo:
               - nameWithOwner: Nome completo (owner/repo)
-              - url: URL do repositório
               - stargazerCount: Número de estrelas
               - createdAt: Data de criação
               - pushedAt: Data do último push
@@ -212,53 +478,92 @@ def fetch_top_repositories(token_manager, limit=100):
               - totalIssues: Total de issues
               - closedIssues: Issues fechadas
     """
+    if limit > PAGE_SIZE:
+        limit = min(limit, count_repositories(token_manager, use_cache))
     if limit <= 0:
         return []
 
-    all_repos = []
-    cursor = None
-    remaining = limit
-    max_iterations = (limit // PAGE_SIZE) + 2  # Proteção contra loop infinito
-
     with tqdm(total=limit, desc="Buscando repositórios", unit="repo", bar_format="{desc}: {percentage:.0f}%|{bar}| [{elapsed}<{remaining}, {rate_fmt}]") as pbar:
-        iteration = 0
-        while remaining > 0 and iteration < max_iterations:
-            iteration += 1
-            batch_size = min(PAGE_SIZE, remaining)
-            variables = {
-                "searchQuery": REPOSITORY_SEARCH_QUERY,
-                "first": batch_size,
-                "after": cursor
-            }
-
-            data = graphql_request(token_manager, GRAPHQL_QUERY, variables)
-            search_result = data["search"]
-            repos = [node for node in search_result["nodes"] if node is not None]
-            
-            # Se não recebeu repositórios, interrompe a busca
-            if not repos:
-                break
-            
-            all_repos.extend(repos)
-            fetched = len(repos)
-            remaining -= fetched
-            pbar.update(fetched)
-            
-            # Verifica se há mais páginas disponíveis
-            page_info = search_result.get("pageInfo", {})
-            has_next = page_info.get("hasNextPage", False)
-            
-            # Para se não há mais páginas ou já coletou o suficiente
-            if not has_next or remaining <= 0:
-                break
-                
-            # Se recebeu menos repositórios que o solicitado, pode não haver mais dados
-            if fetched < batch_size:
-                break
-                
-            cursor = page_info.get("endCursor")
-            
-            # Pequeno delay para evitar sobrecarga na API
-            time.sleep(1)
-    
+        all_repos, page_info = _fetch_page(token_manager, min(PAGE_SIZE, limit), use_cache=use_cache)
+        pbar.update(len(all_repos))
+
+        if len(all_repos) >= limit or not page_info["hasNextPage"]:
+            return all_repos[:limit]
+
+        # Só calcula cursores se o formato conferir com o devolvido pela API
+        if page_info["endCursor"] == _search_cursor(len(all_repos)):
+            try:
+                return all_repos + _fetch_pages_parallel(token_manager, len(all_repos), limit, use_cache, pbar)
+            except GraphQLError as exc:
+                logging.warning("Cursor calculado rejeitado pela API, buscando páginas em sequência: %s", exc)
+                pbar.n = len(all_repos)
+                pbar.refresh()
+
+        return _fetch_pages_serial(token_manager, all_repos, page_info, limit, use_cache, pbar)
+
+
+def _fetch_pages_parallel(token_manager, start, limit, use_cache, pbar):
+    """Busca as páginas restantes em paralelo, com cursores calculados.
+
+    Cada worker fica fixado em um token diferente.
+
+    Args:
+        token_manager (TokenManager): Gerenciador de tokens para autenticação.
+        start (int): Posição do primeiro repositório ainda não buscado.
+        limit (int): Número total de repositórios desejado.
+        use_cache (bool): Se False, ignora o cache local.
+        pbar (tqdm): Barra de progresso a atualizar.
+
+    Returns:
+        list: Repositórios das páginas, na ordem da busca.
+
+    Raises:
+        GraphQLError: Se a API rejeitar algum dos cursores calculados.
+    """
+    pages = [(offset, min(PAGE_SIZE, limit - offset)) for offset in range(start, limit, PAGE_SIZE)]
+    worker_ids = itertools.count()
+
+    def pin_worker():
+        token_manager.pin(next(worker_ids))
+
+    def fetch(page):
+        offset, batch_size = page
+        repos, _ = _fetch_page(token_manager, batch_size, _search_cursor(offset), use_cache)
+        pbar.update(len(repos))
+        return repos
+
+    max_workers = min(len(token_manager.tokens), len(pages))
+    with ThreadPoolExecutor(max_workers=max_workers, initializer=pin_worker) as executor:
+        results = list(executor.map(fetch, pages))
+
+    # Mantém a ordem das páginas e para na primeira página incompleta
+    all_repos = []
+    for (_, batch_size), repos in zip(pages, results):
+        all_repos.extend(repos)
+        if len(repos) < batch_size:
+            break
     return all_repos
+
+
+def _fetch_pages_serial(token_manager, all_repos, page_info, limit, use_cache, pbar):
+    """Busca as páginas restantes encadeando o ``endCursor`` de cada resposta.
+
+    Args:
+        token_manager (TokenManager): Gerenciador de tokens para autenticação.
+        all_repos (list): Repositórios já buscados (estendida no lugar).
+        page_info (dict): ``pageInfo`` da última página buscada.
+        limit (int): Número total de repositórios desejado.
+        use_cache (bool): Se False, ignora o cache local.
+        pbar (tqdm): Barra de progresso a atualizar.
+
+    Returns:
+        list: Todos os repositórios buscados, limitados a ``limit``.
+    """
+    while len(all_repos) < limit and page_info["hasNextPage"]:
+        batch_size = min(PAGE_SIZE, limit - len(all_repos))
+        repos, page_info = _fetch_page(token_manager, batch_size, page_info["endCursor"], use_cache)
+        if not repos:
+            break
+        all_repos.extend(repos)
+        pbar.update(len(repos))
+    return all_repos[:limit]
@@ -15,8 +15,12 @@ GITHUB_GRAPHQL_URL = "https://api.github.com/graphql"
 # Query de busca: repositórios públicos ordenados por estrelas (descendente)
 REPOSITORY_SEARCH_QUERY = "stars:>1 sort:stars-desc is:public"
 
-# Número de repositórios a buscar por requisição (para evitar erros 502)
-PAGE_SIZE = int(os.getenv("PAGE_SIZE", "10"))
+# Número de repositórios a buscar por requisição (máximo 100, limite da API)
+PAGE_SIZE = min(100, int(os.getenv("PAGE_SIZE", "100")))
+
+# Cache local das respostas GraphQL (diretório e validade em segundos)
+GRAPHQL_CACHE_DIR = os.getenv("GRAPHQL_CACHE_DIR", ".graphql_cache")
+GRAPHQL_CACHE_TTL = int(os.getenv("GRAPHQL_CACHE_TTL", "600"))
 
 class Config:
     """
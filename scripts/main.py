@@ -1,8 +1,11 @@
 """Script principal para coleta e analise dos repositorios populares do GitHub.
 
 Este script coordena o processo completo das outras classes e módulos
+
+Uso: python main.py [--no-cache]  (--no-cache ignora o cache local das respostas da API)
 """
 
+import argparse
 from datetime import datetime, timezone
 from cliente_github import TokenManager, fetch_top_repositories
 from configuracao import Config
@@ -19,6 +22,11 @@ def main():
     5. Exibe resultados já formatados no terminal
 	PS.: importante aumentar as linhas do terminal para visualizar os 100 repos (File > Preferences > Settings > Terminal > Integrated: Scrollback)
     """
+    # Ler argumentos de linha de comando
+    parser = argparse.ArgumentParser(description="Coleta repositorios populares do GitHub.")
+    parser.add_argument("--no-cache", action="store_true", help="ignora o cache local das respostas GraphQL")
+    args = parser.parse_args()
+
     # Carregar configuracoes (tokens e limite de repositorios)
     config = Config()
     
@@ -29,6 +37,7 @@ def main():
     raw_repositories = fetch_top_repositories(
         token_manager=token_manager,
         limit=config.limit,
+        use_cache=not args.no_cache,
     )
     
     # Obter timestamp atual para calculos de idade e atualizacao
@@ -5,12 +5,40 @@ calcular metricas estatisticas e formatar a saida de resultados.
 """
 
 import csv
+import sys
+from dataclasses import dataclass, fields
 from datetime import datetime
 
+@dataclass(slots=True)
+class Repository:
+    """Repositorio normalizado com as metricas usadas na analise.
+    
+    Atributos:
+        name: Nome completo (owner/repo)
+        stars: Numero de estrelas
+        age_days: Idade do repositorio em dias
+        prs: Total de pull requests aceitas (merged)
+        releases: Total de releases
+        update_days: Dias desde o ultimo push
+        language: Linguagem principal ("Unknown" se ausente)
+        issues_ratio: Razao entre issues fechadas e total de issues
+    """
+    name: str
+    stars: int
+    age_days: int
+    prs: int
+    releases: int
+    update_days: int
+    language: str
+    issues_ratio: float
+
+# Colunas do CSV, na ordem dos campos de Repository
+FIELDNAMES = [field.name for field in fields(Repository)]
+
 def normalize_repository(repo, now_utc):
     """Normaliza os dados brutos de um repositorio para um formato padronizado.
     
-    Converte os dados da API do GitHub em um dicionario com campos calculados
+    Converte os dados da API do GitHub em um Repository com campos calculados
     e formatados para analise, incluindo idade do repositorio e metricas de issues.
     
     Args:
@@ -18,11 +46,11 @@ def normalize_repository(repo, now_utc):
         now_utc: Datetime atual em UTC para calculos de idade e atualizacao
         
     Returns:
-        dict: Dicionario normalizado contendo metricas do repositorio
+        Repository: Repositorio normalizado contendo suas metricas
     """
-    # Converter timestamps ISO para datetime
-    created_at = datetime.fromisoformat(repo["createdAt"].replace("Z", "+00:00"))
-    pushed_at = datetime.fromisoformat(repo["pushedAt"].replace("Z", "+00:00"))
+    # Converter timestamps ISO para datetime (o Python 3.11+ aceita o sufixo "Z")
+    created_at = datetime.fromisoformat(repo["createdAt"])
+    pushed_at = datetime.fromisoformat(repo["pushedAt"])
     
     # Calcular metricas de issues
     total_issues = repo["totalIssues"]["totalCount"]
@@ -30,16 +58,18 @@ def normalize_repository(repo, now_utc):
     ratio = closed_issues / total_issues if total_issues > 0 else 0
     
     # Retornar dados normalizados
-    return {
-        "name": repo["nameWithOwner"],
-        "stars": repo["stargazerCount"],
-        "age_days": (now_utc - created_at).days,
-        "prs": repo["pullRequests"]["totalCount"],
-        "releases": repo["releases"]["totalCount"],
-        "update_days": (now_utc - pushed_at).days,
-        "language": repo["primaryLanguage"]["name"] if repo["primaryLanguage"] else "Unknown",
-        "issues_ratio": ratio
-    }
+    language = repo["primaryLanguage"]
+    return Repository(
+        name=repo["nameWithOwner"],
+        stars=repo["stargazerCount"],
+        age_days=(now_utc - created_at).days,
+        prs=repo["pullRequests"]["totalCount"],
+        releases=repo["releases"]["totalCount"],
+        update_days=(now_utc - pushed_at).days,
+        # Poucas linguagens distintas: internar compartilha a mesma string
+        language=sys.intern(language["name"]) if language else "Unknown",
+        issues_ratio=ratio,
+    )
 
 def save_to_csv(repositories, filename="repos.csv"):
     """Salva a lista de repositorios em um arquivo CSV.
@@ -51,33 +81,22 @@ def save_to_csv(repositories, filename="repos.csv"):
         repositories: Lista de repositorios normalizados
         filename: Nome do arquivo CSV a ser criado (padrao: repos.csv)
     """
-    # Preparar e formatar dados antes de escrever no CSV
-    rows = []
-    for repo in repositories:
-        row = repo.copy()
-        # Formatar issues_ratio como porcentagem com 2 casas decimais
-        try:
-            ratio = float(row.get("issues_ratio", 0))
-        except (TypeError, ValueError):
-            ratio = 0.0
-        row["issues_ratio"] = f"{ratio * 100:.2f}%"
-        rows.append(row)
-
     # Criar caminho para salvar na pasta resultados
     import os
     output_dir = "resultados"
     os.makedirs(output_dir, exist_ok=True)
     filepath = os.path.join(output_dir, filename)
 
-    # Escrever dados no arquivo CSV
+    # Formatar e escrever cada repositorio em uma unica passada
     with open(filepath, 'w', newline='', encoding='utf-8') as f:
-        writer = csv.DictWriter(
-            f,
-            fieldnames=["name", "stars", "age_days", "prs", "releases", "update_days", "language", "issues_ratio"],
-            delimiter=';'
-        )
-        writer.writeheader()
-        writer.writerows(rows)
+        writer = csv.writer(f, delimiter=';')
+        writer.writerow(FIELDNAMES)
+        ratio_index = FIELDNAMES.index("issues_ratio")
+        for repo in repositories:
+            row = [getattr(repo, name) for name in FIELDNAMES]
+            # Formatar issues_ratio como porcentagem com 2 casas decimais
+            row[ratio_index] = f"{repo.issues_ratio * 100:.2f}%"
+            writer.writerow(row)
 
     print(f"CSV salvo: {filepath}")
 